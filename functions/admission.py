@@ -0,0 +1,230 @@
+import functools
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from shared import env_int, json_response
+
+# Proxies between Google's front end and the function that append their own
+# X-Forwarded-For entry, e.g. 1 behind an external HTTPS load balancer.
+_TRUSTED_PROXY_HOPS = env_int('RATE_LIMIT_TRUSTED_PROXY_HOPS', 0)
+
+# Sustained write rate a single Firestore document handles without contention.
+_FIRESTORE_SHARD_WRITES_PER_SECOND = 1
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} is temporarily unavailable')
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds):
+    return {'Retry-After': str(max(1, math.ceil(seconds)))}
+
+
+def upstream_unavailable_response(error):
+    return json_response(
+        {'error': str(error)},
+        status=503,
+        headers=retry_after_header(error.retry_after),
+    )
+
+
+class _MemoryTokenBuckets:
+    """Per-instance token buckets keyed by client."""
+
+    def __init__(self, capacity, refill_per_second, max_keys=10000):
+        self._capacity = capacity
+        self._refill_per_second = refill_per_second
+        self._max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Consumes one token; returns 0 when admitted, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self._capacity, now))
+            tokens = min(self._capacity, tokens + (now - updated_at) * self._refill_per_second)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / self._refill_per_second
+            if len(self._buckets) > self._max_keys:
+                self._prune(now)
+            return retry_after
+
+    def _prune(self, now):
+        # Buckets idle long enough to have refilled are indistinguishable from new ones.
+        full_after = self._capacity / self._refill_per_second
+        for key, (_, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= full_after:
+                del self._buckets[key]
+
+
+class _FirestoreTokenBuckets:
+    """
+    Token buckets shared by every instance, stored in rateLimits/{bucketId}.
+
+    A single document sustains only about one write per second, so each
+    client's bucket is split into shards that each refill at no more than
+    _FIRESTORE_SHARD_WRITES_PER_SECOND. A request draws from one random shard,
+    which keeps every shard document within its write budget at the limit.
+    Rejections don't write. Documents carry an `expiresAt` field so a Firestore
+    TTL policy can garbage-collect idle buckets.
+    """
+
+    def __init__(self, name, capacity, refill_per_second):
+        self._name = name
+        self._shards = max(1, math.ceil(refill_per_second / _FIRESTORE_SHARD_WRITES_PER_SECOND))
+        self._capacity = max(1.0, capacity / self._shards)
+        self._refill_per_second = refill_per_second / self._shards
+
+    def take(self, key):
+        db = firestore.client()
+        shard = random.randrange(self._shards)
+        bucket_id = f"{self._name}:{key}:{shard}".replace('/', '_')
+        ref = db.collection('rateLimits').document(bucket_id)
+        return _take_firestore_token(db.transaction(), ref, self._capacity, self._refill_per_second)
+
+
+@firestore.transactional
+def _take_firestore_token(transaction, ref, capacity, refill_per_second):
+    snapshot = ref.get(transaction=transaction)
+    data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+    now = time.time()
+    tokens = data.get('tokens', capacity)
+    updated_at = data.get('updatedAtEpoch', now)
+    tokens = min(capacity, tokens + max(0, now - updated_at) * refill_per_second)
+
+    if tokens < 1:
+        # Refill is derived from the stored timestamp, so a rejection needn't write.
+        return (1 - tokens) / refill_per_second
+
+    tokens -= 1
+    transaction.set(ref, {
+        'tokens': tokens,
+        'updatedAtEpoch': now,
+        'expiresAt': datetime.now(timezone.utc) + timedelta(seconds=capacity / refill_per_second),
+    })
+    return 0
+
+
+def _token_buckets(name, capacity, refill_per_second):
+    if os.environ.get('RATE_LIMIT_MODE', 'memory').lower() == 'firestore':
+        return _FirestoreTokenBuckets(name, capacity, refill_per_second)
+    return _MemoryTokenBuckets(capacity, refill_per_second)
+
+
+def _client_key(req):
+    # Clients can send their own X-Forwarded-For; Google's front end appends the
+    # address it saw, so only entries from the right are trustworthy. Proxies we
+    # run in front of it (e.g. an external load balancer) each append one more.
+    hops = [hop.strip() for hop in req.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    if len(hops) > _TRUSTED_PROXY_HOPS:
+        return hops[-1 - _TRUSTED_PROXY_HOPS]
+    return req.remote_addr or 'anonymous'
+
+
+def admission_controlled(name, rate_per_second, burst, max_concurrent):
+    """
+    Sheds load before it reaches the wrapped HTTP function.
+
+    Requests are admitted only if the caller's token bucket has a token and the
+    instance has fewer than `max_concurrent` requests in flight. Everything else
+    gets an immediate 429 with `Retry-After` rather than queuing behind a slow
+    upstream. Set RATE_LIMIT_MODE=firestore to share buckets across instances.
+    """
+    buckets = _token_buckets(name, burst, rate_per_second)
+    in_flight = threading.BoundedSemaphore(max_concurrent)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(req):
+            if req.method == 'OPTIONS':
+                return func(req)
+
+            try:
+                retry_after = buckets.take(_client_key(req))
+            except Exception as e:
+                # Fail open: a rate limiter outage should not take the API down with it.
+                print(f"Rate limiter error for {name}: {str(e)}", flush=True)
+                retry_after = 0
+
+            if retry_after > 0:
+                return json_response(
+                    {'error': 'Rate limit exceeded'},
+                    status=429,
+                    headers=retry_after_header(retry_after),
+                )
+
+            if not in_flight.acquire(blocking=False):
+                return json_response(
+                    {'error': 'Too many concurrent requests'},
+                    status=429,
+                    headers=retry_after_header(1),
+                )
+
+            try:
+                return func(req)
+            finally:
+                in_flight.release()
+
+        return wrapped
+
+    return decorator
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    raise UpstreamUnavailableError for `reset_seconds`. A single probe is then
+    let through; its outcome closes the circuit or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self._reset_seconds - time.monotonic()
+            if remaining > 0 or self._probe_in_flight:
+                raise UpstreamUnavailableError(self.name, max(remaining, 1))
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"Circuit closed for {self.name}", flush=True)
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self._failure_threshold:
+                if self._opened_at is None:
+                    print(f"Circuit opened for {self.name} after {self._failures} failures", flush=True)
+                self._opened_at = time.monotonic()
@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+class TtlCache:
+    """Small thread-safe per-instance cache with a fixed time-to-live."""
+
+    def __init__(self, ttl_seconds, max_entries=5000):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return default
+            return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key, value=True):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                self._evict(now)
+            self._entries[key] = (now + self._ttl_seconds, value)
+
+    def _evict(self, now):
+        for key, (expires_at, _) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[key]
+        # Still full: drop the entries closest to expiry.
+        overflow = len(self._entries) - self._max_entries + 1
+        if overflow > 0:
+            for key, _ in sorted(self._entries.items(), key=lambda item: item[1][0])[:overflow]:
+                del self._entries[key]
+
+
+_MISSING = object()
@@ -0,0 +1,118 @@
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_EARTH_RADIUS_METERS = 6371008.8
+# On the same sphere as distance_meters, so bounding boxes match its circles.
+_METERS_PER_DEGREE = math.pi * _EARTH_RADIUS_METERS / 180
+# Covering is computed for a slightly larger circle. Clamping to a cell's
+# edges doesn't find the exact nearest point on a sphere, and the padding
+# absorbs that error and floating-point error at cell boundaries.
+_COVERING_MARGIN = 1.001
+
+# Precision stored on maypoles; ~4.8 m cells, fine enough for any query radius.
+GEOHASH_PRECISION = 9
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        value_range, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def _cell_size_degrees(precision):
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell_ranges(latitude, longitude, radius_meters, precision):
+    """Row and column index ranges of the precision-`precision` cells spanning the circle's bounding box."""
+    lat_size, lng_size = _cell_size_degrees(precision)
+    d_lat = radius_meters / _METERS_PER_DEGREE
+    # Degrees of longitude per meter grow towards the poles; use the box's polar edge.
+    cos_lat = max(math.cos(math.radians(min(abs(latitude) + d_lat, 90.0))), 1e-6)
+    d_lng = radius_meters / (_METERS_PER_DEGREE * cos_lat)
+
+    rows = int(round(180.0 / lat_size))
+    columns = int(round(360.0 / lng_size))
+    first_row = max(int((latitude - d_lat + 90.0) // lat_size), 0)
+    last_row = min(int((latitude + d_lat + 90.0) // lat_size), rows - 1)
+    if 2 * d_lng >= 360.0:
+        column_range = range(columns)
+    else:
+        column_range = range(int((longitude - d_lng + 180.0) // lng_size),
+                             int((longitude + d_lng + 180.0) // lng_size) + 1)
+    return range(first_row, last_row + 1), column_range, columns
+
+
+def _cell_distance_meters(latitude, longitude, south, west, lat_size, lng_size):
+    """Distance from the point to the nearest point of the cell."""
+    # Shift the cell by whole turns so it sits on the point's side of the antimeridian.
+    west += round((longitude - (west + lng_size / 2)) / 360.0) * 360.0
+    nearest_lat = min(max(latitude, south), south + lat_size)
+    nearest_lng = min(max(longitude, west), west + lng_size)
+    return distance_meters(latitude, longitude, nearest_lat, nearest_lng)
+
+
+def covering_geohashes(latitude, longitude, radius_meters, max_cells=16):
+    """
+    Returns geohash prefixes whose cells together cover the circle.
+
+    Picks the finest precision at which the circle's bounding box spans at most
+    `max_cells` cells, then keeps the cells that intersect the circle. Any
+    point within the radius lies in one of them, so a prefix range query per
+    cell followed by an exact distance filter finds every match while reading
+    little outside the circle.
+    """
+    radius_meters *= _COVERING_MARGIN
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        row_range, column_range, _ = _cell_ranges(latitude, longitude, radius_meters, candidate)
+        if len(row_range) * len(column_range) <= max_cells:
+            precision = candidate
+            break
+
+    lat_size, lng_size = _cell_size_degrees(precision)
+    row_range, column_range, columns = _cell_ranges(latitude, longitude, radius_meters, precision)
+    cells = []
+    for row in row_range:
+        south = row * lat_size - 90.0
+        for column in column_range:
+            west = (column % columns) * lng_size - 180.0
+            if _cell_distance_meters(latitude, longitude, south, west, lat_size, lng_size) > radius_meters:
+                continue
+            cell = encode_geohash(south + lat_size / 2, west + lng_size / 2, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
@@ -7,19 +7,23 @@
 from account_deletion import on_account_deletion_requested
 from notifications import send_notification
 from places import (
+    nearby_maypoles,
     places_autocomplete,
     places_place_details,
     places_reverse_geocode,
+    refresh_maypole,
     resolve_maypole,
 )
 from storage_optimization import optimize_profile_picture
 
 __all__ = [
+    'nearby_maypoles',
     'on_account_deletion_requested',
     'optimize_profile_picture',
     'places_autocomplete',
     'places_place_details',
     'places_reverse_geocode',
+    'refresh_maypole',
     'resolve_maypole',
     'send_notification',
 ]
@@ -1,11 +1,88 @@
 import json
+import os
 import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+from datetime import datetime, timezone
 
 import requests
-from firebase_admin import firestore
-from firebase_functions import https_fn, options
+from firebase_admin import exceptions, firestore, functions
+from firebase_functions import https_fn, options, tasks_fn
+
+from admission import (
+    CircuitBreaker,
+    UpstreamUnavailableError,
+    admission_controlled,
+    upstream_unavailable_response,
+)
+from caching import TtlCache
+from geo import covering_geohashes, distance_meters, encode_geohash
+from shared import env_flag, env_float, env_int, goog_places_api_key, json_response, log_event
+
+# Overridable so load tests can point the functions at a local stub server.
+_PLACES_API_BASE_URL = os.environ.get('PLACES_API_BASE_URL', 'https://places.googleapis.com').rstrip('/')
+_PLACES_TIMEOUT_SECONDS = 10
+_PLACES_RATE_LIMIT_PER_SECOND = env_float('PLACES_RATE_LIMIT_PER_SECOND', 5)
+_PLACES_RATE_LIMIT_BURST = env_int('PLACES_RATE_LIMIT_BURST', 20)
+_PLACES_MAX_CONCURRENT_REQUESTS = env_int('PLACES_MAX_CONCURRENT_REQUESTS', 40)
+
+_places_circuit = CircuitBreaker(
+    'Google Places API',
+    failure_threshold=env_int('PLACES_CIRCUIT_FAILURE_THRESHOLD', 5),
+    reset_seconds=env_float('PLACES_CIRCUIT_RESET_SECONDS', 30),
+)
 
-from shared import goog_places_api_key, json_response
+# Short-lived memory of lookups Google could not answer (place IDs it reports
+# NOT_FOUND, text queries with no match), so clients retrying old IDs don't
+# repeat upstream calls. Hits and stores are logged as `places_negative_cache`
+# events; count them with a log-based metric to see the upstream calls saved.
+_NEGATIVE_CACHE_TTL_SECONDS = env_int('PLACES_NEGATIVE_CACHE_TTL_SECONDS', 600)
+_missing_place_ids = TtlCache(_NEGATIVE_CACHE_TTL_SECONDS)
+_unmatched_text_queries = TtlCache(_NEGATIVE_CACHE_TTL_SECONDS)
+
+# Maypoles whose `updatedAt` is older than this are served as-is but refreshed
+# in the background by the refresh_maypole task queue.
+_MAYPOLE_FRESH_SECONDS = env_int('MAYPOLE_FRESH_SECONDS', 7 * 24 * 60 * 60)
+_MAYPOLE_REFRESH_DEDUP_SECONDS = env_int('MAYPOLE_REFRESH_DEDUP_SECONDS', 60 * 60)
+_queued_refreshes = TtlCache(_MAYPOLE_REFRESH_DEDUP_SECONDS)
+
+# Work that must not hold up a response, such as refresh enqueues. Gen 2
+# functions may throttle CPU once the response is sent, so a pending enqueue
+# can be delayed until the instance's next request; it is best-effort anyway.
+_background_executor = ThreadPoolExecutor(max_workers=4)
+
+# Gates resolve_maypole's read of maypoles/{googlePlaceId}, the legacy document key.
+_LEGACY_LOOKUP_ENABLED = env_flag('MAYPOLE_LEGACY_LOOKUP', True)
+
+_NEARBY_MAX_RADIUS_METERS = 50000
+_NEARBY_MAX_RESULTS = 50
+_NEARBY_PAGE_SIZE = 200
+# Maypole documents nearby_maypoles reads per request, shared by the covering
+# cells. Cells still unread when it runs out mark the response `truncated`.
+_NEARBY_MAX_SCANNED_DOCUMENTS = env_int('NEARBY_MAX_SCANNED_DOCUMENTS', 2000)
+
+# Shared by request handlers that fan out independent Firestore queries.
+_executor = ThreadPoolExecutor(max_workers=32)
+
+# resolve_maypole starts a speculative Text Search if Place Details hasn't
+# answered within the delay. Hedged lookups get their own pool so a saturated
+# Firestore fan-out can't hold Details in the queue while the hedge timer runs.
+# Each admitted request runs at most two calls on it; abandoned calls keep a
+# worker until their HTTP timeout, and a lookup that can't get a worker falls
+# back to running sequentially on the request thread.
+_HEDGE_DELAY_SECONDS = env_float('PLACES_HEDGE_DELAY_SECONDS', 0.5)
+_hedge_executor = ThreadPoolExecutor(max_workers=_PLACES_MAX_CONCURRENT_REQUESTS * 2)
+
+
+def _places_admission(name):
+    return admission_controlled(
+        name,
+        rate_per_second=_PLACES_RATE_LIMIT_PER_SECOND,
+        burst=_PLACES_RATE_LIMIT_BURST,
+        max_concurrent=_PLACES_MAX_CONCURRENT_REQUESTS,
+    )
 
 
 def _slugify(value, fallback='maypole'):
@@ -26,6 +103,27 @@ def _location_slug_from_address(address):
     return _slugify(city_or_area, fallback='nearby')
 
 
+_SEARCH_PREFIX_MIN_LENGTH = 2
+_SEARCH_PREFIX_MAX_LENGTH = 15
+_SEARCH_PREFIX_MAX_COUNT = 150
+
+
+def _search_tokens(value):
+    return [token for token in _slugify(value, fallback='').split('-') if token]
+
+
+def _search_prefixes(*values):
+    """Word prefixes matched by local autocomplete's array-contains-any query."""
+    prefixes = []
+    for value in values:
+        for token in _search_tokens(value):
+            for length in range(_SEARCH_PREFIX_MIN_LENGTH, min(len(token), _SEARCH_PREFIX_MAX_LENGTH) + 1):
+                prefix = token[:length]
+                if prefix not in prefixes:
+                    prefixes.append(prefix)
+    return prefixes[:_SEARCH_PREFIX_MAX_COUNT]
+
+
 def _get_places_api_key(req=None):
     api_key = goog_places_api_key.value
     if not api_key and req is not None:
@@ -33,18 +131,68 @@ def _get_places_api_key(req=None):
     return api_key
 
 
+def _places_request(method, url, **kwargs):
+    """Calls the Places API through the circuit breaker; timeouts, 429s and 5xx count as failures."""
+    _places_circuit.before_call()
+    try:
+        response = requests.request(method, url, timeout=_PLACES_TIMEOUT_SECONDS, **kwargs)
+    except requests.RequestException:
+        _places_circuit.record_failure()
+        raise
+
+    if response.status_code == 429 or response.status_code >= 500:
+        _places_circuit.record_failure()
+    else:
+        _places_circuit.record_success()
+    return response
+
+
+def _normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+# Place fields consumed by _place_details_to_metadata.
+_PLACE_FIELDS = ['id', 'displayName', 'formattedAddress', 'location', 'primaryType', 'types']
+_PLACE_DETAILS_FIELD_MASK = ','.join(_PLACE_FIELDS)
+_PLACE_SEARCH_FIELD_MASK = ','.join(f'places.{field}' for field in _PLACE_FIELDS)
+
+
+def _places_error_reason(response):
+    """The ErrorInfo reason of a Places API error body, e.g. 'API_KEY_INVALID'."""
+    try:
+        error = response.json().get('error') or {}
+    except ValueError:
+        return None
+    for detail in error.get('details') or []:
+        if isinstance(detail, dict) and detail.get('reason'):
+            return detail['reason']
+    return None
+
+
+def _log_negative_cache(cache, result, key):
+    log_event(
+        'places_negative_cache',
+        f'Places negative cache {result} for {cache}: {key}',
+        cache=cache,
+        result=result,
+    )
+
+
 def _fetch_place_details(place_id, api_key):
     if not place_id or not api_key:
         return None
+    if place_id in _missing_place_ids:
+        _log_negative_cache('placeDetails', 'hit', place_id)
+        return None
 
-    response = requests.get(
-        f'https://places.googleapis.com/v1/places/{place_id}',
+    response = _places_request(
+        'GET',
+        f'{_PLACES_API_BASE_URL}/v1/places/{place_id}',
         headers={
             'Content-Type': 'application/json',
             'X-Goog-Api-Key': api_key,
-            'X-Goog-FieldMask': 'id,displayName,formattedAddress,location,primaryType,types',
+            'X-Goog-FieldMask': _PLACE_DETAILS_FIELD_MASK,
         },
-        timeout=10,
     )
 
     if response.status_code == 200:
@@ -54,35 +202,47 @@ def _fetch_place_details(place_id, api_key):
         f'Place Details failed for {place_id}: {response.status_code} {response.text}',
         flush=True,
     )
-    if response.status_code in (401, 403):
+    # An invalid key is a 400, not a 401/403; it must not pass for a missing place.
+    if response.status_code in (401, 403) or _places_error_reason(response) == 'API_KEY_INVALID':
         raise RuntimeError(
             'Google Places API key is not authorized for server-side Place Details requests. '
             'Check the GOOGLE_PLACES_API_KEY function secret and its API key restrictions.'
         )
+    if response.status_code == 404:
+        _missing_place_ids.set(place_id)
+        _log_negative_cache('placeDetails', 'store', place_id)
     return None
 
 
 def _search_place_by_text(query, api_key):
     if not query or not api_key:
         return None
+    normalized_query = _normalize_query(query)
+    if normalized_query in _unmatched_text_queries:
+        _log_negative_cache('textSearch', 'hit', normalized_query)
+        return None
 
-    response = requests.post(
-        'https://places.googleapis.com/v1/places:searchText',
+    response = _places_request(
+        'POST',
+        f'{_PLACES_API_BASE_URL}/v1/places:searchText',
         headers={
             'Content-Type': 'application/json',
             'X-Goog-Api-Key': api_key,
-            'X-Goog-FieldMask': 'places.id,places.displayName,places.formattedAddress,places.location,places.primaryType,places.types',
+            'X-Goog-FieldMask': _PLACE_SEARCH_FIELD_MASK,
         },
         json={
             'textQuery': query,
             'maxResultCount': 1,
         },
-        timeout=10,
     )
 
     if response.status_code == 200:
         places = response.json().get('places', [])
-        return places[0] if places else None
+        if not places:
+            _unmatched_text_queries.set(normalized_query)
+            _log_negative_cache('textSearch', 'store', normalized_query)
+            return None
+        return places[0]
 
     print(
         f'Place Text Search failed for {query}: {response.status_code} {response.text}',
@@ -96,6 +256,66 @@ def _search_place_by_text(query, api_key):
     return None
 
 
+def _lookup_place(google_place_id, query, api_key):
+    """
+    Place Details for the ID, falling back to Text Search on the request context.
+
+    Without a text query the two steps simply run in order. With one, a slow
+    Place Details call is hedged: Text Search starts once Details has been in
+    flight for _HEDGE_DELAY_SECONDS. Its result wins only if it has the same
+    place ID; Text Search returns one best match, which may be a neighbouring
+    business that would otherwise be recorded as this ID's successor. Otherwise
+    Details is awaited and Text Search used only if it finds nothing, as in the
+    sequential path. The losing call is abandoned, though an HTTP request
+    already in flight still runs to its own timeout in the background. If the
+    hedge pool is too busy to start Details within the hedge delay, the lookup
+    runs sequentially on the request thread instead.
+    """
+    if not google_place_id:
+        return _search_place_by_text(query, api_key)
+    if not query:
+        return _fetch_place_details(google_place_id, api_key)
+
+    details_started = threading.Event()
+
+    def fetch_details():
+        details_started.set()
+        return _fetch_place_details(google_place_id, api_key)
+
+    details_future = _hedge_executor.submit(fetch_details)
+    # Time the hedge from when Details actually starts, not from when it was queued.
+    if not details_started.wait(timeout=_HEDGE_DELAY_SECONDS) and details_future.cancel():
+        print(f'Hedge pool busy; looking up {google_place_id} sequentially', flush=True)
+        details = _fetch_place_details(google_place_id, api_key)
+        return details if details is not None else _search_place_by_text(query, api_key)
+    details_started.wait()
+    try:
+        details = details_future.result(timeout=_HEDGE_DELAY_SECONDS)
+    except FutureTimeoutError:
+        pass
+    else:
+        return details if details is not None else _search_place_by_text(query, api_key)
+
+    text_future = _hedge_executor.submit(_search_place_by_text, query, api_key)
+    done, _ = wait([details_future, text_future], return_when=FIRST_COMPLETED)
+
+    if details_future not in done:
+        try:
+            text_result = text_future.result()
+        except (requests.RequestException, UpstreamUnavailableError):
+            text_result = None
+        if text_result is not None and text_result.get('id') == google_place_id:
+            details_future.cancel()
+            print(f'Place Details for {google_place_id} abandoned for a matching Text Search result', flush=True)
+            return text_result
+
+    details = details_future.result()
+    if details is not None:
+        text_future.cancel()
+        return details
+    return text_future.result()
+
+
 _NEARBY_INCLUDED_TYPES = [
     'restaurant',
     'cafe',
@@ -119,12 +339,13 @@ _NEARBY_INCLUDED_TYPES = [
 
 
 def _search_nearby(latitude, longitude, radius_meters, max_result_count, api_key, included_types=None):
-    response = requests.post(
-        'https://places.googleapis.com/v1/places:searchNearby',
+    response = _places_request(
+        'POST',
+        f'{_PLACES_API_BASE_URL}/v1/places:searchNearby',
         headers={
             'Content-Type': 'application/json',
             'X-Goog-Api-Key': api_key,
-            'X-Goog-FieldMask': 'places.id,places.displayName,places.formattedAddress,places.location,places.primaryType,places.types',
+            'X-Goog-FieldMask': _PLACE_SEARCH_FIELD_MASK,
         },
         json={
             'includedTypes': included_types or _NEARBY_INCLUDED_TYPES,
@@ -140,7 +361,6 @@ def _search_nearby(latitude, longitude, radius_meters, max_result_count, api_key
             'maxResultCount': max_result_count,
             'rankPreference': 'DISTANCE',
         },
-        timeout=10,
     )
 
     if response.status_code == 200:
@@ -185,9 +405,29 @@ def _place_details_to_metadata(place_details, fallback_place_id=None):
     if place_details.get('types'):
         metadata['placeTypes'] = place_details.get('types')
 
+    metadata.update(_maypole_index_fields(metadata))
     return metadata
 
 
+def _maypole_index_fields(maypole_data):
+    """Derived fields that back Firestore-side maypole queries."""
+    fields = {}
+    latitude = maypole_data.get('latitude')
+    longitude = maypole_data.get('longitude')
+    if latitude is not None and longitude is not None:
+        fields['geohash'] = encode_geohash(latitude, longitude)
+
+    # Name words only: local autocomplete must match a maypole by what it is
+    # called, and location words would match every maypole in a city.
+    search_prefixes = _search_prefixes(
+        maypole_data.get('name'),
+        maypole_data.get('placeSlug'),
+    )
+    if search_prefixes:
+        fields['searchPrefixes'] = search_prefixes
+    return fields
+
+
 def _alias_payload(maypole_id, status='current'):
     return {
         'maypoleId': maypole_id,
@@ -196,6 +436,130 @@ def _alias_payload(maypole_id, status='current'):
     }
 
 
+def _legacy_maypole_metadata(legacy_id, data, name='', address=''):
+    """Fields that upgrade a maypole keyed by its Google Place ID to the alias scheme."""
+    metadata = {
+        'id': legacy_id,
+        'googlePlaceId': data.get('googlePlaceId') or legacy_id,
+        'googlePlaceIdAliases': firestore.ArrayUnion([legacy_id]),
+        'locationSlug': data.get('locationSlug') or _location_slug_from_address(data.get('address') or address),
+        'placeSlug': data.get('placeSlug') or _slugify(data.get('name') or name),
+    }
+    metadata.update(_maypole_index_fields({'name': name, **data, **metadata}))
+    return metadata
+
+
+def _stage_resolved_maypole(writer, db, maypole_id, place_details, current_google_place_id, stale_google_place_id=None):
+    """Stages the maypole and alias writes for a resolved place on a WriteBatch or Transaction."""
+    metadata = _place_details_to_metadata(place_details, fallback_place_id=current_google_place_id)
+    metadata['id'] = maypole_id
+
+    if stale_google_place_id and stale_google_place_id != current_google_place_id:
+        metadata['googlePlaceIdAliases'] = firestore.ArrayUnion([stale_google_place_id, current_google_place_id])
+        writer.set(
+            db.collection('placeIdAliases').document(stale_google_place_id),
+            _alias_payload(maypole_id, status='stale'),
+            merge=True,
+        )
+
+    writer.set(db.collection('maypoles').document(maypole_id), metadata, merge=True)
+    writer.set(
+        db.collection('placeIdAliases').document(current_google_place_id),
+        _alias_payload(maypole_id, status='current'),
+        merge=True,
+    )
+    return metadata
+
+
+@firestore.transactional
+def _commit_resolution(transaction, db, place_details, current_google_place_id, stale_google_place_id=None,
+                       maypole_id=None):
+    """
+    Finds or allocates the maypole for a place and writes it with its aliases in one commit.
+
+    The current alias document is the uniqueness guard: it is read inside the
+    transaction, so concurrent first-time resolves of the same place conflict on
+    it. The losing transaction retries, finds the winner's alias and reuses its
+    maypole instead of creating a duplicate.
+
+    Passing `maypole_id` updates that maypole in place (background refreshes).
+    If the current alias already belongs to another maypole, nothing is written
+    and (owner maypole ID, None) is returned, so an alias is never repointed.
+    """
+    alias_ref = db.collection('placeIdAliases').document(current_google_place_id)
+    alias_doc = alias_ref.get(transaction=transaction)
+    aliased_maypole_id = (alias_doc.to_dict() or {}).get('maypoleId') if alias_doc.exists else None
+    if maypole_id and aliased_maypole_id and aliased_maypole_id != maypole_id:
+        return aliased_maypole_id, None
+    maypole_id = maypole_id or aliased_maypole_id
+
+    # Maypoles created before aliases existed are only findable by field. This
+    # stays on with MAYPOLE_LEGACY_LOOKUP=false: it only runs for places without
+    # an alias, and is the sole way to find a maypole whose alias was never written.
+    if not maypole_id:
+        existing = (
+            db.collection('maypoles')
+            .where('googlePlaceId', '==', current_google_place_id)
+            .limit(1)
+        )
+        existing_doc = next(iter(transaction.get(existing)), None)
+        maypole_id = existing_doc.id if existing_doc else None
+
+    if not maypole_id:
+        maypole_id = db.collection('maypoles').document().id
+
+    metadata = _stage_resolved_maypole(
+        transaction,
+        db,
+        maypole_id,
+        place_details,
+        current_google_place_id,
+        stale_google_place_id,
+    )
+    return maypole_id, metadata
+
+
+def _is_stale(maypole_data):
+    updated_at = maypole_data.get('updatedAt')
+    if not isinstance(updated_at, datetime):
+        return True
+    age = datetime.now(timezone.utc) - updated_at
+    return age.total_seconds() > _MAYPOLE_FRESH_SECONDS
+
+
+def _queue_maypole_refresh(maypole_id, google_place_id):
+    """
+    Schedules a background refresh, at most once per maypole per dedup window.
+
+    The Cloud Tasks enqueue is an HTTP call (plus a token fetch on first use),
+    so it runs on _background_executor and the stale maypole is served without
+    waiting for it. The task ID embeds the window so Cloud Tasks rejects
+    duplicates enqueued by other instances; the in-memory set just avoids the
+    round trip on repeats.
+    """
+    if maypole_id in _queued_refreshes:
+        return False
+    _queued_refreshes.set(maypole_id)
+
+    window = int(datetime.now(timezone.utc).timestamp() // _MAYPOLE_REFRESH_DEDUP_SECONDS)
+    task_id = re.sub(r'[^A-Za-z0-9_-]', '-', f'refresh-{maypole_id}-{window}')
+    _background_executor.submit(_enqueue_maypole_refresh, maypole_id, google_place_id, task_id)
+    return True
+
+
+def _enqueue_maypole_refresh(maypole_id, google_place_id, task_id):
+    try:
+        functions.task_queue('refresh_maypole').enqueue(
+            {'maypoleId': maypole_id, 'googlePlaceId': google_place_id},
+            functions.TaskOptions(task_id=task_id),
+        )
+    except exceptions.AlreadyExistsError:
+        pass
+    except Exception as e:
+        # Serving the stale document is still correct; the next window retries.
+        print(f"Unable to queue refresh for maypole {maypole_id}: {str(e)}", flush=True)
+
+
 @https_fn.on_request(
     cors=options.CorsOptions(
         cors_origins="*",
@@ -204,6 +568,7 @@ def _alias_payload(maypole_id, status='current'):
     max_instances=10,
     secrets=[goog_places_api_key],
 )
+@_places_admission('resolve_maypole')
 def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
     """
     Resolves mutable Google Place IDs to canonical Maypole IDs.
@@ -231,7 +596,15 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
 
         stale_google_place_id = google_place_id
         alias_ref = db.collection('placeIdAliases').document(google_place_id) if google_place_id else None
-        alias_doc = alias_ref.get() if alias_ref else None
+        legacy_ref = db.collection('maypoles').document(google_place_id) \
+            if google_place_id and _LEGACY_LOOKUP_ENABLED else None
+
+        # Alias and legacy documents are independent, so fetch both in one round trip.
+        snapshots = {
+            snapshot.reference.path: snapshot
+            for snapshot in db.get_all([ref for ref in (alias_ref, legacy_ref) if ref])
+        } if alias_ref else {}
+        alias_doc = snapshots.get(alias_ref.path) if alias_ref else None
 
         if alias_doc and alias_doc.exists:
             alias_data = alias_doc.to_dict() or {}
@@ -239,6 +612,11 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
             maypole_doc = db.collection('maypoles').document(maypole_id).get()
             if maypole_id and maypole_doc.exists:
                 data = maypole_doc.to_dict() or {}
+                stale = _is_stale(data)
+                refresh_queued = stale and _queue_maypole_refresh(
+                    maypole_id,
+                    data.get('googlePlaceId') or google_place_id,
+                )
                 return json_response({
                     'maypoleId': maypole_id,
                     'googlePlaceId': data.get('googlePlaceId') or google_place_id,
@@ -250,23 +628,22 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
                     'locationSlug': data.get('locationSlug'),
                     'placeSlug': data.get('placeSlug'),
                     'resolvedFromAlias': True,
+                    'stale': stale,
+                    'refreshQueued': refresh_queued,
                 })
 
         # Backward compatibility: existing maypoles may still be keyed by Google Place ID.
-        if google_place_id:
-            legacy_doc = db.collection('maypoles').document(google_place_id).get()
-            if legacy_doc.exists:
+        # Disable with MAYPOLE_LEGACY_LOOKUP=false once tools/migrate_legacy_maypoles.py has run.
+        if legacy_ref:
+            legacy_doc = snapshots.get(legacy_ref.path)
+            if legacy_doc and legacy_doc.exists:
                 data = legacy_doc.to_dict() or {}
-                metadata = {
-                    'id': google_place_id,
-                    'googlePlaceId': data.get('googlePlaceId') or google_place_id,
-                    'googlePlaceIdAliases': firestore.ArrayUnion([google_place_id]),
-                    'locationSlug': data.get('locationSlug') or _location_slug_from_address(data.get('address') or address),
-                    'placeSlug': data.get('placeSlug') or _slugify(data.get('name') or name),
-                    'updatedAt': firestore.SERVER_TIMESTAMP,
-                }
-                legacy_doc.reference.set(metadata, merge=True)
-                alias_ref.set(_alias_payload(google_place_id), merge=True)
+                metadata = _legacy_maypole_metadata(google_place_id, data, name=name, address=address)
+                metadata['updatedAt'] = firestore.SERVER_TIMESTAMP
+                batch = db.batch()
+                batch.set(legacy_doc.reference, metadata, merge=True)
+                batch.set(alias_ref, _alias_payload(google_place_id), merge=True)
+                batch.commit()
                 return json_response({
                     'maypoleId': google_place_id,
                     'googlePlaceId': metadata['googlePlaceId'],
@@ -280,47 +657,22 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
                     'resolvedLegacyDocument': True,
                 })
 
-        place_details = _fetch_place_details(google_place_id, api_key) if google_place_id else None
-        if place_details is None:
-            query = ' '.join(part for part in [name, address] if part).strip()
-            if not query and (place_slug or location_slug):
-                query = f"{place_slug.replace('-', ' ')} {location_slug.replace('-', ' ')}".strip()
-            place_details = _search_place_by_text(query, api_key)
+        query = ' '.join(part for part in [name, address] if part).strip()
+        if not query and (place_slug or location_slug):
+            query = f"{place_slug.replace('-', ' ')} {location_slug.replace('-', ' ')}".strip()
+        place_details = _lookup_place(google_place_id, query, api_key)
 
         if place_details is None:
             return json_response({'error': 'Unable to resolve place'}, status=404)
 
         current_google_place_id = place_details.get('id') or google_place_id
-        current_alias_ref = db.collection('placeIdAliases').document(current_google_place_id)
-        current_alias_doc = current_alias_ref.get()
-
-        if current_alias_doc.exists:
-            maypole_id = (current_alias_doc.to_dict() or {}).get('maypoleId')
-        else:
-            existing = (
-                db.collection('maypoles')
-                .where('googlePlaceId', '==', current_google_place_id)
-                .limit(1)
-                .stream()
-            )
-            existing_doc = next(existing, None)
-            maypole_id = existing_doc.id if existing_doc else db.collection('maypoles').document().id
-
-        metadata = _place_details_to_metadata(place_details, fallback_place_id=current_google_place_id)
-        metadata['id'] = maypole_id
-        maypole_ref = db.collection('maypoles').document(maypole_id)
-        maypole_ref.set(metadata, merge=True)
-
-        current_alias_ref.set(_alias_payload(maypole_id, status='current'), merge=True)
-        if stale_google_place_id and stale_google_place_id != current_google_place_id:
-            db.collection('placeIdAliases').document(stale_google_place_id).set(
-                _alias_payload(maypole_id, status='stale'),
-                merge=True,
-            )
-            maypole_ref.set({
-                'googlePlaceIdAliases': firestore.ArrayUnion([stale_google_place_id, current_google_place_id]),
-                'updatedAt': firestore.SERVER_TIMESTAMP,
-            }, merge=True)
+        maypole_id, metadata = _commit_resolution(
+            db.transaction(),
+            db,
+            place_details,
+            current_google_place_id,
+            stale_google_place_id,
+        )
 
         return json_response({
             'maypoleId': maypole_id,
@@ -334,11 +686,243 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
             'placeSlug': metadata.get('placeSlug'),
             'resolvedFromStalePlaceId': stale_google_place_id != current_google_place_id,
         })
+    except UpstreamUnavailableError as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         print(f"Error resolving maypole: {str(e)}", flush=True)
         return json_response({'error': str(e)}, status=500)
 
 
+@tasks_fn.on_task_dispatched(
+    retry_config=options.RetryConfig(max_attempts=3, min_backoff_seconds=60),
+    rate_limits=options.RateLimits(max_concurrent_dispatches=5, max_dispatches_per_second=2),
+    max_instances=2,
+    secrets=[goog_places_api_key],
+)
+def refresh_maypole(req: tasks_fn.CallableRequest) -> None:
+    """
+    Re-fetches Place Details for a stale maypole and updates its metadata and aliases.
+
+    Enqueued by resolve_maypole when it serves a maypole older than
+    MAYPOLE_FRESH_SECONDS. The queue's rate limits bound the global refresh rate.
+    Text Search is only tried once Google reports the place ID NOT_FOUND; other
+    upstream failures raise so the task's RetryConfig retries it.
+    """
+    maypole_id = (req.data or {}).get('maypoleId')
+    if not maypole_id:
+        return
+
+    db = firestore.client()
+    maypole_doc = db.collection('maypoles').document(maypole_id).get()
+    if not maypole_doc.exists:
+        print(f"Skipping refresh of missing maypole {maypole_id}", flush=True)
+        return
+
+    data = maypole_doc.to_dict() or {}
+    if not _is_stale(data):
+        return
+
+    api_key = _get_places_api_key()
+    google_place_id = data.get('googlePlaceId') or req.data.get('googlePlaceId')
+    place_details = _fetch_place_details(google_place_id, api_key)
+    if place_details is None and google_place_id and google_place_id not in _missing_place_ids:
+        # Not a NOT_FOUND (5xx, 429, ...): Text Search could swap in a neighbouring
+        # business and mark a valid ID stale, so let the queue retry instead.
+        raise RuntimeError(f"Place Details unavailable for {google_place_id}; retrying refresh of {maypole_id}")
+    if place_details is None:
+        query = ' '.join(part for part in [data.get('name'), data.get('address')] if part).strip()
+        place_details = _search_place_by_text(query, api_key)
+
+    if place_details is None:
+        print(f"Unable to refresh maypole {maypole_id}: place not found", flush=True)
+        return
+
+    current_google_place_id = place_details.get('id') or google_place_id
+    owner_id, metadata = _commit_resolution(
+        db.transaction(),
+        db,
+        place_details,
+        current_google_place_id,
+        google_place_id,
+        maypole_id=maypole_id,
+    )
+    if metadata is None:
+        print(
+            f"Not refreshing maypole {maypole_id}: {current_google_place_id} already belongs to maypole {owner_id}",
+            flush=True,
+        )
+        return
+    print(f"Refreshed maypole {maypole_id} ({current_google_place_id})", flush=True)
+
+
+_LOCAL_AUTOCOMPLETE_FIELDS = [
+    'googlePlaceId',
+    'googlePlaceIdAliases',
+    'name',
+    'address',
+    'latitude',
+    'longitude',
+    'placeType',
+    'placeSlug',
+    'locationSlug',
+]
+_LOCAL_AUTOCOMPLETE_CANDIDATES = 50
+_LOCAL_AUTOCOMPLETE_MAX_RESULTS = 5
+# Candidates are drawn from this far around the request's location circle at most.
+_LOCAL_AUTOCOMPLETE_MAX_RADIUS_METERS = 50000
+_LOCAL_AUTOCOMPLETE_MAX_CELLS = 9
+# Firestore accepts at most 30 values in an array-contains-any filter.
+_LOCAL_AUTOCOMPLETE_MAX_LOOKUP_TOKENS = 30
+# Google is skipped when the maypoles index alone yields at least this many
+# matches within the request's location circle.
+_LOCAL_AUTOCOMPLETE_MIN_RESULTS = env_int('LOCAL_AUTOCOMPLETE_MIN_RESULTS', 3)
+
+
+def _autocomplete_circle(request_data):
+    """(kind, latitude, longitude, radius) of the request's location circle, if any."""
+    for key in ('locationRestriction', 'locationBias'):
+        circle = (request_data.get(key) or {}).get('circle') or {}
+        center = circle.get('center') or {}
+        if center.get('latitude') is None or center.get('longitude') is None:
+            continue
+        try:
+            latitude, longitude = float(center['latitude']), float(center['longitude'])
+            radius = float(circle.get('radius') or 0)
+        except (TypeError, ValueError):
+            return None
+        if not 0 < radius <= _LOCAL_AUTOCOMPLETE_MAX_RADIUS_METERS:
+            radius = _LOCAL_AUTOCOMPLETE_MAX_RADIUS_METERS
+        return key, latitude, longitude, radius
+    return None
+
+
+def _local_autocomplete_candidates(db, lookup_tokens, circle):
+    """Returns (candidate documents, whether any query hit its limit)."""
+    query = (
+        db.collection('maypoles')
+        .where('searchPrefixes', 'array_contains_any', lookup_tokens)
+        .select(_LOCAL_AUTOCOMPLETE_FIELDS)
+    )
+    if not circle:
+        docs = list(query.limit(_LOCAL_AUTOCOMPLETE_CANDIDATES).stream())
+        return docs, len(docs) >= _LOCAL_AUTOCOMPLETE_CANDIDATES
+
+    # Without a location constraint the query returns the first matches in
+    # document-ID order from anywhere, so scope it to the circle's cells.
+    _, latitude, longitude, radius = circle
+    cells = covering_geohashes(latitude, longitude, radius, max_cells=_LOCAL_AUTOCOMPLETE_MAX_CELLS)
+    per_cell = max(10, -(-_LOCAL_AUTOCOMPLETE_CANDIDATES // len(cells)))
+    pages = list(_executor.map(
+        lambda cell: list(
+            query.where('geohash', '>=', cell).where('geohash', '<=', cell + '~').limit(per_cell).stream()
+        ),
+        cells,
+    ))
+    return [doc for page in pages for doc in page], any(len(page) >= per_cell for page in pages)
+
+
+def _local_autocomplete(db, request_data, circle=None):
+    """
+    Matches the autocomplete input against the maypoles `searchPrefixes` index.
+
+    `searchPrefixes` holds name and place-slug word prefixes only, so an
+    array-contains-any query over the query words finds maypoles whose name
+    matches at least one of them; it is restricted to the geohash cells
+    covering `circle` when there is one. Every query word must then
+    prefix-match the maypole's name or slugs, including its location slug.
+    Maypoles outside the circle are dropped. Matches are ranked by name-prefix
+    match, then by distance from the circle's center.
+
+    Returns (Places-style `placePrediction` suggestions, truncated). A query
+    that hit its candidate limit is `truncated`: nearer or better matches may
+    have been cut off, so the result can't stand in for Google's.
+    """
+    query_tokens = _search_tokens(request_data.get('input'))
+    lookup_tokens = list(dict.fromkeys(
+        token[:_SEARCH_PREFIX_MAX_LENGTH] for token in query_tokens if len(token) >= _SEARCH_PREFIX_MIN_LENGTH
+    ))[:_LOCAL_AUTOCOMPLETE_MAX_LOOKUP_TOKENS]
+    if not lookup_tokens:
+        return [], False
+
+    docs, truncated = _local_autocomplete_candidates(db, lookup_tokens, circle)
+
+    name_prefix = ' '.join(query_tokens)
+    ranked = {}
+    for doc in docs:
+        data = doc.to_dict() or {}
+        if not data.get('googlePlaceId'):
+            continue
+        place_tokens = _search_tokens(data.get('name')) + _search_tokens(data.get('placeSlug'))
+        doc_tokens = place_tokens + _search_tokens(data.get('locationSlug'))
+        if not all(any(doc_token.startswith(token) for doc_token in doc_tokens) for token in query_tokens):
+            continue
+        # Documents indexed before searchPrefixes dropped location words may
+        # still match on the location slug alone.
+        if not any(place_token.startswith(token) for place_token in place_tokens for token in query_tokens):
+            continue
+
+        distance = None
+        if circle:
+            if data.get('latitude') is None or data.get('longitude') is None:
+                continue
+            _, latitude, longitude, radius = circle
+            distance = distance_meters(latitude, longitude, data['latitude'], data['longitude'])
+            if distance > radius:
+                continue
+
+        name_match = ' '.join(_search_tokens(data.get('name'))).startswith(name_prefix)
+        ranked[doc.id] = ((not name_match, distance if distance is not None else float('inf')), data)
+
+    ordered = sorted(ranked.values(), key=lambda item: item[0])
+    return [_maypole_suggestion(data) for _, data in ordered[:_LOCAL_AUTOCOMPLETE_MAX_RESULTS]], truncated
+
+
+def _maypole_suggestion(data):
+    name = data.get('name') or ''
+    address = data.get('address') or ''
+    suggestion = {
+        'placePrediction': {
+            'place': f"places/{data['googlePlaceId']}",
+            'placeId': data['googlePlaceId'],
+            'text': {'text': f'{name}, {address}' if address else name},
+            'structuredFormat': {
+                'mainText': {'text': name},
+                'secondaryText': {'text': address},
+            },
+        },
+        # Lets clients skip the follow-up Place Details call for coordinates.
+        'latitude': data.get('latitude'),
+        'longitude': data.get('longitude'),
+        'placeType': data.get('placeType'),
+        '_aliases': [data['googlePlaceId'], *(data.get('googlePlaceIdAliases') or [])],
+    }
+    return suggestion
+
+
+def _merge_suggestions(local_suggestions, google_suggestions):
+    """Local maypoles first, then Google results not already covered by a maypole."""
+    seen = set()
+    merged = []
+    for suggestion in local_suggestions:
+        seen.update(suggestion.pop('_aliases'))
+        merged.append(suggestion)
+    for suggestion in google_suggestions:
+        place_id = (suggestion.get('placePrediction') or {}).get('placeId')
+        if place_id and place_id in seen:
+            continue
+        seen.add(place_id)
+        merged.append(suggestion)
+    return merged
+
+
+def _autocomplete_response(suggestions, source):
+    return https_fn.Response(
+        json.dumps({'suggestions': suggestions}),
+        status=200,
+        headers={'Content-Type': 'application/json', 'X-Autocomplete-Source': source},
+    )
+
+
 @https_fn.on_request(
     cors=options.CorsOptions(
         cors_origins="*",
@@ -347,11 +931,17 @@ def resolve_maypole(req: https_fn.Request) -> https_fn.Response:
     max_instances=10,
     secrets=[goog_places_api_key],
 )
+@_places_admission('places_autocomplete')
 def places_autocomplete(req: https_fn.Request) -> https_fn.Response:
     """
     Proxy function for Google Places API autocomplete requests.
     This avoids CORS issues when calling from web clients.
     CORS is handled by the decorator, so no manual headers needed.
+
+    Existing maypoles are matched locally first; Google is only skipped when the
+    request has a location circle and at least LOCAL_AUTOCOMPLETE_MIN_RESULTS
+    maypoles inside it match. Otherwise its results are merged behind the local
+    ones, deduplicated by Google Place ID.
     """
     if req.method != 'POST':
         return https_fn.Response(
@@ -375,7 +965,7 @@ def places_autocomplete(req: https_fn.Request) -> https_fn.Response:
             'suggestions.placePrediction.placeId,suggestions.placePrediction.text,suggestions.placePrediction.structuredFormat'
         )
 
-        places_url = 'https://places.googleapis.com/v1/places:autocomplete'
+        places_url = f'{_PLACES_API_BASE_URL}/v1/places:autocomplete'
         headers = {
             'Content-Type': 'application/json',
             'X-Goog-Api-Key': api_key,
@@ -390,19 +980,44 @@ def places_autocomplete(req: https_fn.Request) -> https_fn.Response:
                 headers={'Content-Type': 'application/json'}
             )
 
-        response = requests.post(
-            places_url,
-            headers=headers,
-            json=request_data,
-            timeout=10
-        )
+        circle = _autocomplete_circle(request_data)
+        try:
+            local_suggestions, local_truncated = _local_autocomplete(firestore.client(), request_data, circle)
+        except Exception as e:
+            print(f"Local autocomplete failed: {str(e)}", flush=True)
+            local_suggestions, local_truncated = [], True
+
+        # Matches from anywhere, or from a cut-off candidate set, can't stand in
+        # for Google's location-aware results.
+        if circle and not local_truncated and len(local_suggestions) >= _LOCAL_AUTOCOMPLETE_MIN_RESULTS:
+            return _autocomplete_response(_merge_suggestions(local_suggestions, []), 'local')
+
+        try:
+            response = _places_request(
+                'POST',
+                places_url,
+                headers=headers,
+                json=request_data,
+            )
+        except (UpstreamUnavailableError, requests.RequestException):
+            if not local_suggestions:
+                raise
+            return _autocomplete_response(_merge_suggestions(local_suggestions, []), 'local')
 
-        return https_fn.Response(
-            response.text,
-            status=response.status_code,
-            headers={'Content-Type': 'application/json'}
-        )
+        if not local_suggestions:
+            return https_fn.Response(
+                response.text,
+                status=response.status_code,
+                headers={'Content-Type': 'application/json'}
+            )
+        if response.status_code != 200:
+            return _autocomplete_response(_merge_suggestions(local_suggestions, []), 'local')
 
+        google_suggestions = response.json().get('suggestions', [])
+        return _autocomplete_response(_merge_suggestions(local_suggestions, google_suggestions), 'merged')
+
+    except UpstreamUnavailableError as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return https_fn.Response(
             json.dumps({'error': str(e)}),
@@ -419,6 +1034,7 @@ def places_autocomplete(req: https_fn.Request) -> https_fn.Response:
     max_instances=10,
     secrets=[goog_places_api_key],
 )
+@_places_admission('places_place_details')
 def places_place_details(req: https_fn.Request) -> https_fn.Response:
     """
     Proxy function for Google Places API place details requests.
@@ -448,6 +1064,8 @@ def places_place_details(req: https_fn.Request) -> https_fn.Response:
             return json_response({'error': 'Place not found'}, status=404)
 
         return json_response(details)
+    except UpstreamUnavailableError as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return json_response({'error': str(e)}, status=500)
 
@@ -460,6 +1078,7 @@ def places_place_details(req: https_fn.Request) -> https_fn.Response:
     max_instances=10,
     secrets=[goog_places_api_key],
 )
+@_places_admission('places_reverse_geocode')
 def places_reverse_geocode(req: https_fn.Request) -> https_fn.Response:
     """
     Proxy function for Google Places API nearby search ("reverse geocode").
@@ -496,5 +1115,140 @@ def places_reverse_geocode(req: https_fn.Request) -> https_fn.Response:
         )
 
         return json_response(result or {'places': []})
+    except UpstreamUnavailableError as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return json_response({'error': str(e)}, status=500)
+
+
+_NEARBY_FIELDS = [
+    'googlePlaceId',
+    'name',
+    'address',
+    'latitude',
+    'longitude',
+    'placeType',
+    'locationSlug',
+    'placeSlug',
+]
+
+
+class _ReadBudget:
+    """Documents a request may still read, shared by its parallel cell scans."""
+
+    def __init__(self, documents):
+        self._remaining = documents
+        self._lock = threading.Lock()
+
+    def take(self, documents):
+        with self._lock:
+            granted = min(documents, self._remaining)
+            self._remaining -= granted
+            return granted
+
+    def give_back(self, documents):
+        with self._lock:
+            self._remaining += documents
+
+
+def _maypoles_in_cell(db, cell, budget, place_type=None):
+    """Pages through one geohash cell; returns (documents, whether the budget cut it off)."""
+    query = db.collection('maypoles')
+    if place_type:
+        query = query.where('placeType', '==', place_type)
+    query = (
+        query
+        .where('geohash', '>=', cell)
+        .where('geohash', '<=', cell + '~')
+        # The paging cursor is built from the geohash ordering field.
+        .select(_NEARBY_FIELDS + ['geohash'])
+    )
+
+    docs = []
+    while True:
+        page_size = budget.take(_NEARBY_PAGE_SIZE)
+        if not page_size:
+            return docs, True
+        page_query = query.limit(page_size)
+        if docs:
+            page_query = page_query.start_after(docs[-1])
+        page = list(page_query.stream())
+        docs.extend(page)
+        if len(page) < page_size:
+            budget.give_back(page_size - len(page))
+            return docs, False
+
+
+@https_fn.on_request(
+    cors=options.CorsOptions(
+        cors_origins="*",
+        cors_methods=["get", "post", "options"],
+    ),
+    max_instances=10,
+)
+@_places_admission('nearby_maypoles')
+def nearby_maypoles(req: https_fn.Request) -> https_fn.Response:
+    """
+    Returns existing maypoles within a radius, served from Firestore alone.
+
+    Accepts a JSON body of { latitude, longitude, radiusMeters, maxResultCount,
+    placeType } and returns { "maypoles": [...], "truncated": bool } sorted by
+    distance. Each covering geohash cell is range-queried in parallel, then
+    results are filtered and ranked by exact distance. `truncated` is set when
+    the cells held more maypoles than the per-request read budget, in which
+    case some matches may be missing.
+    """
+    if req.method != 'POST':
+        return json_response({'error': 'Method not allowed'}, status=405)
+
+    try:
+        body = req.get_json(silent=True) or {}
+        if body.get('latitude') is None or body.get('longitude') is None:
+            return json_response({'error': 'latitude and longitude are required'}, status=400)
+
+        try:
+            latitude = float(body['latitude'])
+            longitude = float(body['longitude'])
+            radius_meters = float(body.get('radiusMeters', 150))
+            max_result_count = int(body.get('maxResultCount', 20))
+        except (TypeError, ValueError):
+            return json_response(
+                {'error': 'latitude, longitude, radiusMeters and maxResultCount must be numbers'},
+                status=400,
+            )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return json_response({'error': 'latitude or longitude is out of range'}, status=400)
+        if not radius_meters > 0 or max_result_count < 1:
+            return json_response({'error': 'radiusMeters and maxResultCount must be positive'}, status=400)
+
+        radius_meters = min(radius_meters, _NEARBY_MAX_RADIUS_METERS)
+        max_result_count = min(max_result_count, _NEARBY_MAX_RESULTS)
+        place_type = body.get('placeType')
+
+        db = firestore.client()
+        cells = covering_geohashes(latitude, longitude, radius_meters)
+        budget = _ReadBudget(_NEARBY_MAX_SCANNED_DOCUMENTS)
+        pages = _executor.map(lambda cell: _maypoles_in_cell(db, cell, budget, place_type), cells)
+
+        results = {}
+        truncated = False
+        for docs, cell_truncated in pages:
+            truncated = truncated or cell_truncated
+            for doc in docs:
+                data = doc.to_dict() or {}
+                if data.get('latitude') is None or data.get('longitude') is None:
+                    continue
+                distance = distance_meters(latitude, longitude, data['latitude'], data['longitude'])
+                if distance <= radius_meters:
+                    results[doc.id] = {
+                        'maypoleId': doc.id,
+                        **{field: data.get(field) for field in _NEARBY_FIELDS},
+                        'distanceMeters': round(distance, 1),
+                    }
+
+        if truncated:
+            print(f"Nearby maypoles truncated at ({latitude}, {longitude}) within {radius_meters}m", flush=True)
+        maypoles = sorted(results.values(), key=lambda item: item['distanceMeters'])[:max_result_count]
+        return json_response({'maypoles': maypoles, 'truncated': truncated})
     except Exception as e:
         return json_response({'error': str(e)}, status=500)
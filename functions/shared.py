@@ -1,4 +1,5 @@
 import json
+import os
 import sys
 
 from firebase_admin import initialize_app
@@ -20,7 +21,34 @@ hive_access_id = SecretParam("HIVE_ACCESS_ID_KEY")
 hive_api_token = SecretParam("HIVE_API_TOKEN")
 
 
-def json_response(data, status=200):
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def log_event(event, message, **fields):
+    # Cloud Logging parses JSON lines on stdout into jsonPayload, so `event`
+    # and the extra fields can back log-based metrics across all instances.
+    print(json.dumps({'severity': 'INFO', 'message': message, 'event': event, **fields}), flush=True)
+
+
+def json_response(data, status=200, headers=None):
     # NOTE: CORS headers are intentionally NOT set here. Every function that
     # returns json_response is decorated with `@https_fn.on_request(cors=...)`,
     # which already injects the Access-Control-Allow-* headers. Adding them here
@@ -32,5 +60,6 @@ def json_response(data, status=200):
         status=status,
         headers={
             'Content-Type': 'application/json',
+            **(headers or {}),
         },
     )
@@ -13,6 +13,77 @@ def _get_pil_image():
     return Image
 
 
+# suffix: (max width, max height, JPEG quality)
+_VARIANT_SIZES = {
+    'thumb': (150, 150, 85),
+    'medium': (400, 400, 90),
+    'large': (800, 800, 92),
+}
+
+
+def _load_image(image_bytes):
+    Image = _get_pil_image()
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img
+
+
+def _encode_variant(img, width, height, quality):
+    Image = _get_pil_image()
+    img_copy = img.copy()
+    img_copy.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+    output_buffer = io.BytesIO()
+    img_copy.save(
+        output_buffer,
+        format='JPEG',
+        quality=quality,
+        optimize=True,
+        progressive=True,
+    )
+    output_buffer.seek(0)
+    return output_buffer, img_copy.width, img_copy.height
+
+
+def _optimize_stored_image(bucket, file_path):
+    """
+    Writes the resized JPEG variants of `file_path` next to it in `bucket`.
+
+    Only needs `bucket.blob(path)` objects with download_as_bytes,
+    upload_from_file, make_public and public_url, so tools can substitute a
+    local stand-in for Cloud Storage.
+    """
+    blob = bucket.blob(file_path)
+    image_bytes = blob.download_as_bytes()
+    img = _load_image(image_bytes)
+
+    file_name = os.path.splitext(file_path)[0]
+    uploaded_variants = []
+
+    for suffix, (width, height, quality) in _VARIANT_SIZES.items():
+        output_buffer, variant_width, variant_height = _encode_variant(img, width, height, quality)
+
+        optimized_path = f"{file_name}_{suffix}.jpg"
+        optimized_blob = bucket.blob(optimized_path)
+        optimized_blob.upload_from_file(
+            output_buffer,
+            content_type='image/jpeg'
+        )
+        optimized_blob.make_public()
+
+        uploaded_variants.append({
+            'size': suffix,
+            'path': optimized_path,
+            'url': optimized_blob.public_url,
+            'dimensions': f"{variant_width}x{variant_height}"
+        })
+
+        print(f"Created {suffix} variant: {optimized_path} ({variant_width}x{variant_height})")
+
+    return uploaded_variants
+
+
 @storage_fn.on_object_finalized(
     max_instances=10,
     memory=options.MemoryOption.MB_512,
@@ -46,57 +117,8 @@ def optimize_profile_picture(event: storage_fn.CloudEvent[storage_fn.StorageObje
         return
 
     try:
-        Image = _get_pil_image()
-
         bucket = storage.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-
-        image_bytes = blob.download_as_bytes()
-        img = Image.open(io.BytesIO(image_bytes))
-
-        if img.mode not in ('RGB', 'L'):
-            img = img.convert('RGB')
-
-        file_name = os.path.splitext(file_path)[0]
-
-        sizes = {
-            'thumb': (150, 150, 85),
-            'medium': (400, 400, 90),
-            'large': (800, 800, 92),
-        }
-
-        uploaded_variants = []
-
-        for suffix, (width, height, quality) in sizes.items():
-            img_copy = img.copy()
-            img_copy.thumbnail((width, height), Image.Resampling.LANCZOS)
-
-            output_buffer = io.BytesIO()
-            img_copy.save(
-                output_buffer,
-                format='JPEG',
-                quality=quality,
-                optimize=True,
-                progressive=True,
-            )
-            output_buffer.seek(0)
-
-            optimized_path = f"{file_name}_{suffix}.jpg"
-            optimized_blob = bucket.blob(optimized_path)
-            optimized_blob.upload_from_file(
-                output_buffer,
-                content_type='image/jpeg'
-            )
-            optimized_blob.make_public()
-
-            uploaded_variants.append({
-                'size': suffix,
-                'path': optimized_path,
-                'url': optimized_blob.public_url,
-                'dimensions': f"{img_copy.width}x{img_copy.height}"
-            })
-
-            print(f"Created {suffix} variant: {optimized_path} ({img_copy.width}x{img_copy.height})")
+        uploaded_variants = _optimize_stored_image(bucket, file_path)
 
         print(f"✓ Successfully optimized profile picture: {file_path}")
         print(f"✓ Created {len(uploaded_variants)} variants")
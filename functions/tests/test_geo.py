@@ -0,0 +1,47 @@
+import math
+import random
+
+from geo import _EARTH_RADIUS_METERS, _cell_size_degrees, covering_geohashes, distance_meters, encode_geohash
+
+
+def _destination(latitude, longitude, bearing_degrees, distance):
+    """Point `distance` meters from the start along a great circle, on the sphere distance_meters uses."""
+    phi1 = math.radians(latitude)
+    lambda1 = math.radians(longitude)
+    bearing = math.radians(bearing_degrees)
+    delta = distance / _EARTH_RADIUS_METERS
+    phi2 = math.asin(math.sin(phi1) * math.cos(delta) + math.cos(phi1) * math.sin(delta) * math.cos(bearing))
+    lambda2 = lambda1 + math.atan2(
+        math.sin(bearing) * math.sin(delta) * math.cos(phi1),
+        math.cos(delta) - math.sin(phi1) * math.sin(phi2),
+    )
+    return math.degrees(phi2), (math.degrees(lambda2) + 540.0) % 360.0 - 180.0
+
+
+def _assert_covered(latitude, longitude, radius, point):
+    cells = covering_geohashes(latitude, longitude, radius)
+    assert distance_meters(latitude, longitude, *point) <= radius
+    geohash = encode_geohash(*point)
+    assert any(geohash.startswith(cell) for cell in cells), (latitude, longitude, radius, point, cells)
+
+
+def test_point_due_north_at_radius_across_row_boundary():
+    radius = 5000
+    # Center just under the radius south of a cell row boundary, so the
+    # northernmost points of the circle lie on the next row.
+    cells = covering_geohashes(40.0, -74.0, radius)
+    lat_size, _ = _cell_size_degrees(len(cells[0]))
+    boundary = math.ceil((40.0 + 90.0) / lat_size) * lat_size - 90.0
+    latitude = boundary - math.degrees((radius - 0.05) / _EARTH_RADIUS_METERS)
+    _assert_covered(latitude, -74.0, radius, _destination(latitude, -74.0, 0, radius - 0.01))
+
+
+def test_points_on_circle_edge_are_covered():
+    rng = random.Random(31)
+    for _ in range(400):
+        latitude = rng.uniform(-80, 80)
+        longitude = rng.choice([rng.uniform(-180, 180), 179.999, -179.999])
+        radius = rng.choice([50, 150, 1000, 5000, 20000, 50000])
+        for bearing in range(0, 360, 5):
+            point = _destination(latitude, longitude, bearing, radius * (1 - 1e-6))
+            _assert_covered(latitude, longitude, radius, point)
@@ -0,0 +1,43 @@
+"""
+Backfills the derived query fields (see places._maypole_index_fields) on every
+maypole: the `geohash` that nearby_maypoles range-queries and the
+`searchPrefixes` that places_autocomplete matches locally.
+
+New and refreshed maypoles get these fields when resolve_maypole writes them;
+this job brings existing documents up to date. Documents whose fields already
+match are skipped, so the job is safe to re-run after the index definition
+changes. Run from the functions/ directory with Application Default Credentials:
+
+    python -m tools.backfill_maypole_index --dry-run
+    python -m tools.backfill_maypole_index --workers 8
+"""
+import argparse
+
+from places import _maypole_index_fields
+from tools.firestore_jobs import add_job_arguments, run_paged_job
+
+
+def _plan_writes(db, doc_id, data):
+    fields = _maypole_index_fields(data)
+    if all(data.get(key) == value for key, value in fields.items()):
+        return []
+    return [(db.collection('maypoles').document(doc_id), fields)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_job_arguments(parser, checkpoint='backfill_maypole_index.checkpoint')
+    args = parser.parse_args()
+
+    run_paged_job(
+        'maypoles',
+        _plan_writes,
+        page_size=args.page_size,
+        workers=args.workers,
+        checkpoint=None if args.dry_run else args.checkpoint,
+        dry_run=args.dry_run,
+    )
+
+
+if __name__ == '__main__':
+    main()
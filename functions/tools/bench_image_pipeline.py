@@ -0,0 +1,318 @@
+"""
+Offline benchmark for the profile picture pipeline in storage_optimization.
+
+Generates a synthetic corpus (0.3-50 MP JPEG and PNG, alpha and palette
+images, EXIF-rotated photos, and JPEGs at HEIC camera resolutions, since
+Pillow cannot write HEIC without a plugin) and runs each input through
+_optimize_stored_image against a local-filesystem stand-in for Cloud Storage.
+
+Every case runs in a fresh process so its peak RSS is measured in isolation
+and compared to the function's 512 MB memory limit. Reported per case:
+decode time, per-variant encode time and output bytes, end-to-end time,
+throughput and peak RSS. Results are compared to a stored baseline, or saved
+as the new one with --save-baseline; with --compare the exit status is
+non-zero on regressions, when a case exceeds the memory limit, or when the
+baseline file or a case in it is missing.
+
+Timings only compare meaningfully on the machine that produced them, so no
+baseline ships with the repo. Record the reference baseline once on the
+machine that will run --compare (ideally one resembling the function's
+1 vCPU), commit tools/image_bench_baseline.json, and re-save it whenever an
+intended change moves the numbers.
+
+Run from the functions/ directory:
+
+    python -m tools.bench_image_pipeline --quick
+    python -m tools.bench_image_pipeline --save-baseline
+    python -m tools.bench_image_pipeline --compare
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# storage_optimization registers a Storage trigger on import, which needs a
+# default bucket name; nothing here talks to Firebase.
+os.environ.setdefault('FIREBASE_CONFIG', json.dumps({
+    'projectId': 'demo-maypole',
+    'storageBucket': 'demo-maypole.appspot.com',
+}))
+
+_MEMORY_LIMIT_MB = 512
+_DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'image_bench_baseline.json')
+
+# name: (megapixels, aspect ratio, mode, format, EXIF orientation)
+_CORPUS = {
+    'jpeg_0.3mp': (0.3, 4 / 3, 'RGB', 'JPEG', None),
+    'jpeg_2mp': (2, 4 / 3, 'RGB', 'JPEG', None),
+    'jpeg_12mp_exif_rotated': (12, 4 / 3, 'RGB', 'JPEG', 6),
+    'heic_like_12mp': (12.2, 4 / 3, 'RGB', 'JPEG', None),
+    'heic_like_48mp': (48.8, 4 / 3, 'RGB', 'JPEG', None),
+    'jpeg_50mp': (50, 3 / 2, 'RGB', 'JPEG', None),
+    'png_alpha_2mp': (2, 1, 'RGBA', 'PNG', None),
+    'png_alpha_12mp': (12, 4 / 3, 'RGBA', 'PNG', None),
+    'png_palette_2mp': (2, 16 / 9, 'P', 'PNG', None),
+    'jpeg_grayscale_8mp': (8, 4 / 3, 'L', 'JPEG', None),
+}
+_QUICK_CORPUS = ['jpeg_0.3mp', 'jpeg_12mp_exif_rotated', 'png_alpha_2mp', 'png_palette_2mp']
+
+
+class _LocalBlob:
+    def __init__(self, root, path):
+        self._file_path = os.path.join(root, path)
+        self.public_url = f'file://{self._file_path}'
+
+    def download_as_bytes(self):
+        with open(self._file_path, 'rb') as f:
+            return f.read()
+
+    def upload_from_file(self, file_obj, content_type=None):
+        os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+        with open(self._file_path, 'wb') as f:
+            f.write(file_obj.read())
+
+    def make_public(self):
+        pass
+
+
+class LocalBucket:
+    """Filesystem stand-in for the google.cloud.storage Bucket calls the pipeline makes."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def blob(self, path):
+        return _LocalBlob(self.root, path)
+
+
+def _synthetic_image(megapixels, aspect, mode):
+    from PIL import Image, ImageDraw
+
+    width = int(math.sqrt(megapixels * 1e6 * aspect))
+    height = int(megapixels * 1e6 / width)
+
+    # Gradients plus a grid give JPEG/PNG encoders realistic, non-trivial
+    # content while staying cheap to generate at 50 MP.
+    red = Image.linear_gradient('L').resize((width, height))
+    green = Image.radial_gradient('L').resize((width, height))
+    blue = red.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    img = Image.merge('RGB', (red, green, blue))
+    draw = ImageDraw.Draw(img)
+    step = max(width // 40, 8)
+    for x in range(0, width, step):
+        draw.line([(x, 0), (x, height)], fill=(255, 255, 255), width=2)
+    for y in range(0, height, step):
+        draw.line([(0, y), (width, y)], fill=(0, 0, 0), width=2)
+
+    if mode == 'RGBA':
+        img.putalpha(Image.radial_gradient('L').resize((width, height)))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.Palette.ADAPTIVE, colors=64)
+    elif mode == 'L':
+        img = img.convert('L')
+    return img
+
+
+def _write_corpus(directory, names):
+    from PIL import Image
+
+    paths = {}
+    for name in names:
+        megapixels, aspect, mode, image_format, orientation = _CORPUS[name]
+        img = _synthetic_image(megapixels, aspect, mode)
+        extension = 'jpg' if image_format == 'JPEG' else 'png'
+        relative_path = f'profile_pictures/{name}.{extension}'
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        save_kwargs = {'quality': 92} if image_format == 'JPEG' else {}
+        if orientation:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            save_kwargs['exif'] = exif.tobytes()
+        img.save(path, format=image_format, **save_kwargs)
+        paths[name] = relative_path
+        print(f"Generated {name}: {img.width}x{img.height} {mode} {image_format} "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)", flush=True)
+    return paths
+
+
+def _peak_rss_mb():
+    # Linux keeps ru_maxrss across fork+exec, so a spawned worker would inherit
+    # the parent's corpus-generation peak; VmHWM is reset with the new process image.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms kilobytes.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_case(root, relative_path, repeat):
+    """Runs in a fresh process; returns timings, output sizes and peak RSS."""
+    from storage_optimization import _VARIANT_SIZES, _encode_variant, _load_image, _optimize_stored_image
+
+    bucket = LocalBucket(root)
+    with open(os.path.join(root, relative_path), 'rb') as f:
+        image_bytes = f.read()
+
+    decode_times = []
+    variant_times = {suffix: [] for suffix in _VARIANT_SIZES}
+    variant_bytes = {}
+    end_to_end_times = []
+
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        img = _load_image(image_bytes)
+        img.load()
+        decode_times.append(time.perf_counter() - started_at)
+        megapixels = img.width * img.height / 1e6
+
+        for suffix, (width, height, quality) in _VARIANT_SIZES.items():
+            started_at = time.perf_counter()
+            output_buffer, _, _ = _encode_variant(img, width, height, quality)
+            variant_times[suffix].append(time.perf_counter() - started_at)
+            variant_bytes[suffix] = output_buffer.getbuffer().nbytes
+        del img
+
+        started_at = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _optimize_stored_image(bucket, relative_path)
+        end_to_end_times.append(time.perf_counter() - started_at)
+
+    end_to_end = statistics.median(end_to_end_times)
+    return {
+        'megapixels': round(megapixels, 2),
+        'inputBytes': len(image_bytes),
+        'decodeSeconds': statistics.median(decode_times),
+        'variants': {
+            suffix: {
+                'encodeSeconds': statistics.median(times),
+                'outputBytes': variant_bytes[suffix],
+            }
+            for suffix, times in variant_times.items()
+        },
+        'endToEndSeconds': end_to_end,
+        'megapixelsPerSecond': megapixels / end_to_end if end_to_end else None,
+        'peakRssMb': round(_peak_rss_mb(), 1),
+    }
+
+
+def run(names, repeat=3):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='image-bench-') as root:
+        paths = _write_corpus(root, names)
+        spawn = multiprocessing.get_context('spawn')
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                results[name] = executor.submit(_run_case, root, paths[name], repeat).result()
+    return results
+
+
+def _compare(results, baseline, tolerance, require_baseline=False):
+    """
+    Returns human-readable regressions against the baseline and the memory limit.
+
+    Cases missing from the baseline count only with `require_baseline`.
+    """
+    regressions = []
+    for name, result in results.items():
+        if result['peakRssMb'] > _MEMORY_LIMIT_MB:
+            regressions.append(f"{name}: peak RSS {result['peakRssMb']} MB exceeds {_MEMORY_LIMIT_MB} MB limit")
+
+        previous = baseline.get(name)
+        if not previous:
+            if require_baseline:
+                regressions.append(f"{name}: no baseline entry; record one with --save-baseline")
+            continue
+        checks = [
+            ('end-to-end time', result['endToEndSeconds'], previous['endToEndSeconds']),
+            ('peak RSS', result['peakRssMb'], previous['peakRssMb']),
+        ]
+        for suffix, variant in result['variants'].items():
+            checks.append((f'{suffix} bytes', variant['outputBytes'], previous['variants'][suffix]['outputBytes']))
+        for label, current, before in checks:
+            if before and current > before * (1 + tolerance):
+                regressions.append(f"{name}: {label} {current:.3g} vs baseline {before:.3g} "
+                                   f"(+{(current / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _print_report(results, baseline):
+    print()
+    print(f"{'case':<26}{'MP':>6}{'decode':>9}{'thumb':>8}{'medium':>8}{'large':>8}"
+          f"{'total':>9}{'MP/s':>8}{'out KB':>9}{'RSS MB':>9}{'vs base':>9}")
+    for name, result in results.items():
+        variants = result['variants']
+        output_kb = sum(variant['outputBytes'] for variant in variants.values()) / 1024
+        previous = baseline.get(name)
+        delta = ''
+        if previous:
+            delta = f"{(result['endToEndSeconds'] / previous['endToEndSeconds'] - 1) * 100:+.0f}%"
+        print(
+            f"{name:<26}{result['megapixels']:>6}"
+            f"{result['decodeSeconds'] * 1000:>7.0f}ms"
+            + ''.join(f"{variants[suffix]['encodeSeconds'] * 1000:>6.0f}ms" for suffix in ('thumb', 'medium', 'large'))
+            + f"{result['endToEndSeconds'] * 1000:>7.0f}ms"
+            f"{result['megapixelsPerSecond']:>8.1f}{output_kb:>9.1f}{result['peakRssMb']:>9.1f}{delta:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='run a small subset of the corpus')
+    parser.add_argument('--case', action='append', choices=sorted(_CORPUS), help='run only these cases')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; medians are reported')
+    parser.add_argument('--baseline', default=_DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='exit non-zero on regressions vs the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown/growth')
+    parser.add_argument('--json', help='also write the raw results to this file')
+    args = parser.parse_args()
+
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; record one with --save-baseline before using --compare")
+
+    names = args.case or (_QUICK_CORPUS if args.quick else list(_CORPUS))
+    results = run(names, repeat=args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    _print_report(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+
+    regressions = _compare(results, baseline, args.tolerance, require_baseline=args.compare)
+    if regressions:
+        print('\nRegressions:')
+        for regression in regressions:
+            print(f"  {regression}")
+    if args.compare and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
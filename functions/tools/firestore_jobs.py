@@ -0,0 +1,130 @@
+"""Paging, parallel batch commits and checkpointing shared by the offline Firestore jobs."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+
+# Firestore caps a batch at 500 writes.
+_MAX_BATCH_WRITES = 500
+
+
+def _read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return f.read().strip() or None
+    return None
+
+
+def _write_checkpoint(path, doc_id):
+    if path and doc_id:
+        with open(path, 'w') as f:
+            f.write(doc_id)
+
+
+def _commit_writes(db, writes):
+    batch = db.batch()
+    for ref, data in writes:
+        batch.set(ref, data, merge=True)
+    batch.commit()
+    return len(writes)
+
+
+def run_paged_job(collection, plan_writes, select=None, page_size=1000, workers=8, checkpoint=None, dry_run=False,
+                  prefetch=None):
+    """
+    Pages through a collection in document-ID order and applies planned writes.
+
+    `plan_writes(db, doc_id, data)` returns the (ref, data) merge-writes for one
+    document. Writes are committed in parallel batches while the next page is
+    read; a page is checkpointed only once all of its batches have committed.
+    Returns (documents scanned, documents updated).
+
+    `prefetch(db, doc_id, data)`, if given, returns references to other
+    documents plan_writes needs to read. They are fetched for the whole page
+    with one get_all, and plan_writes is called with a fourth argument mapping
+    document paths to their snapshots.
+    """
+    db = firestore.client()
+    collection_ref = db.collection(collection)
+    last_id = _read_checkpoint(checkpoint)
+    if last_id:
+        print(f"Resuming after {collection}/{last_id}", flush=True)
+
+    scanned = updated = 0
+    started_at = time.monotonic()
+    pending = None
+
+    def settle(page):
+        nonlocal updated
+        last_page_id, futures, planned_docs = page
+        for future in futures:
+            future.result()
+        updated += planned_docs
+        _write_checkpoint(checkpoint, last_page_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            query = collection_ref.order_by('__name__')
+            if select:
+                query = query.select(select)
+            query = query.limit(page_size)
+            if last_id:
+                query = query.where('__name__', '>', collection_ref.document(last_id))
+            page = list(query.stream())
+            if not page:
+                break
+
+            scanned += len(page)
+            last_id = page[-1].id
+
+            docs = [(doc.id, doc.to_dict() or {}) for doc in page]
+            extra_args = ()
+            if prefetch:
+                refs = {ref.path: ref for doc_id, data in docs for ref in prefetch(db, doc_id, data)}
+                snapshots = {
+                    snapshot.reference.path: snapshot
+                    for snapshot in db.get_all(list(refs.values()))
+                } if refs else {}
+                extra_args = (snapshots,)
+
+            writes = []
+            planned_docs = 0
+            for doc_id, data in docs:
+                doc_writes = plan_writes(db, doc_id, data, *extra_args)
+                if doc_writes:
+                    planned_docs += 1
+                    writes.extend(doc_writes)
+
+            futures = []
+            if not dry_run:
+                futures = [
+                    executor.submit(_commit_writes, db, writes[i:i + _MAX_BATCH_WRITES])
+                    for i in range(0, len(writes), _MAX_BATCH_WRITES)
+                ]
+
+            if pending:
+                settle(pending)
+            pending = (last_id, futures, planned_docs)
+
+            elapsed = max(time.monotonic() - started_at, 1e-6)
+            print(
+                f"Scanned {scanned} {collection} documents, {'planned' if dry_run else 'updated'} {updated} "
+                f"({scanned / elapsed:.0f} docs/s, {updated / elapsed:.0f} updates/s)",
+                flush=True,
+            )
+
+        if pending:
+            settle(pending)
+
+    elapsed = time.monotonic() - started_at
+    print(f"Done: scanned {scanned}, updated {updated} in {elapsed:.1f}s", flush=True)
+    return scanned, updated
+
+
+def add_job_arguments(parser, checkpoint):
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8, help='parallel batch commits')
+    parser.add_argument('--checkpoint', default=checkpoint,
+                        help='file storing the last committed document ID; empty to disable')
+    parser.add_argument('--dry-run', action='store_true', help='count documents to update without writing')
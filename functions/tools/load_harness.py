@@ -0,0 +1,486 @@
+"""
+End-to-end load harness for the Places HTTP functions.
+
+Drives resolve_maypole, places_autocomplete, places_place_details and
+places_reverse_geocode in-process against the Firestore emulator and a local
+stub Places API server with configurable latency and error profiles. Reports
+p50/p95/p99 latency, throughput and status codes per function, plus upstream
+Places calls and Firestore operations per request, so caching and batching
+changes can be measured before they ship.
+
+Start the emulator first (never point this at a real project), then run from
+the functions/ directory:
+
+    firebase emulators:start --only firestore
+    export FIRESTORE_EMULATOR_HOST=127.0.0.1:8080
+    python -m tools.load_harness --requests 2000 --concurrency 32 --profile slow
+    python -m tools.load_harness --mix resolve_maypole=1 --stale-rate 0.3 --reset-firestore
+    python -m tools.load_harness --profile degraded --p99-ms 6000 --error-rate 0.2
+
+--profile picks a preset; --median-ms, --p99-ms, --error-rate, --rate-limited-rate
+and --hang-rate override individual values of it.
+
+Firestore and upstream counters are process-wide, so per-request figures are
+averages over the whole mix; run a single-function mix to attribute them.
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PROJECT_ID = 'demo-maypole'
+
+# name: (median ms, p99 ms, 5xx rate, 429 rate, hang rate)
+_PROFILE_FIELDS = ('median_ms', 'p99_ms', 'error_rate', 'rate_limited_rate', 'hang_rate')
+_PROFILES = {
+    'healthy': (60, 250, 0.0, 0.0, 0.0),
+    'slow': (400, 3000, 0.01, 0.0, 0.0),
+    'degraded': (250, 2500, 0.1, 0.05, 0.01),
+    'outage': (100, 500, 0.9, 0.05, 0.05),
+}
+_HANG_SECONDS = 12
+_DEFAULT_MIX = 'resolve_maypole=3,places_autocomplete=10,places_place_details=2,places_reverse_geocode=1'
+
+_CENTER = (40.7128, -74.0060)
+_NAME_WORDS = ['Maple', 'Harbor', 'Union', 'Golden', 'Corner', 'Riverside', 'Liberty', 'Sunset']
+_KIND_WORDS = ['Cafe', 'Pizza', 'Bakery', 'Books', 'Tavern', 'Market', 'Gym', 'Park']
+
+
+class _Counters:
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self._counts[key] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+upstream_calls = _Counters()
+firestore_ops = _Counters()
+
+
+def _stub_place(index):
+    rng = random.Random(index)
+    name = f"{_NAME_WORDS[index % len(_NAME_WORDS)]} {_KIND_WORDS[(index // len(_NAME_WORDS)) % len(_KIND_WORDS)]} {index}"
+    return {
+        'id': f'stubPlace{index:06d}',
+        'displayName': {'text': name, 'languageCode': 'en'},
+        'formattedAddress': f'{index} Stub Street, New York, NY 10001, USA',
+        'location': {
+            'latitude': _CENTER[0] + rng.uniform(-0.05, 0.05),
+            'longitude': _CENTER[1] + rng.uniform(-0.05, 0.05),
+        },
+        'primaryType': 'cafe',
+        'types': ['cafe', 'food', 'point_of_interest', 'establishment'],
+    }
+
+
+class StubPlacesServer:
+    """
+    Minimal Places API (New) stand-in serving a deterministic pool of places.
+
+    IDs of the form `stale-<n>` answer 404 from Place Details, like IDs Google has
+    retired; Text Search still finds place n by its name.
+    """
+
+    def __init__(self, pool_size, profile, seed=0):
+        self.pool_size = pool_size
+        self.median_ms, self.p99_ms, self.error_rate, self.rate_limited_rate, self.hang_rate = profile
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _random(self):
+        with self._rng_lock:
+            return self._rng.random(), self._rng.gauss(0, 1)
+
+    def _delay_and_fault(self):
+        """Sleeps for a latency sample; returns an error status to send, if any."""
+        roll, z = self._random()
+        sigma = math.log(max(self.p99_ms, self.median_ms) / self.median_ms) / 2.326 if self.median_ms else 0
+        time.sleep(self.median_ms * math.exp(sigma * z) / 1000)
+        if roll < self.hang_rate:
+            time.sleep(_HANG_SECONDS)
+            return 504
+        roll -= self.hang_rate
+        if roll < self.error_rate:
+            return 503
+        roll -= self.error_rate
+        if roll < self.rate_limited_rate:
+            return 429
+        return None
+
+    def _place_for_text(self, text):
+        match = re.search(r'(\d+)', text or '')
+        index = int(match.group(1)) if match else None
+        return _stub_place(index) if index is not None and index < self.pool_size else None
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The function gave up on a hung call after its own timeout.
+                    pass
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                place_id = self.path.split('?')[0].rsplit('/', 1)[-1]
+                upstream_calls.add('placeDetails')
+                status = stub._delay_and_fault()
+                if status:
+                    return self._send(status, {'error': {'code': status}})
+                match = re.fullmatch(r'stubPlace(\d+)', place_id)
+                if not match or int(match.group(1)) >= stub.pool_size:
+                    return self._send(404, {'error': {'code': 404, 'status': 'NOT_FOUND'}})
+                self._send(200, _stub_place(int(match.group(1))))
+
+            def do_POST(self):
+                method = self.path.split(':')[-1]
+                body = self._body()
+                upstream_calls.add(method)
+                status = stub._delay_and_fault()
+                if status:
+                    return self._send(status, {'error': {'code': status}})
+
+                if method == 'searchText':
+                    place = stub._place_for_text(body.get('textQuery'))
+                    return self._send(200, {'places': [place]} if place else {})
+                if method == 'searchNearby':
+                    count = body.get('maxResultCount', 5)
+                    places = [_stub_place(random.randrange(stub.pool_size)) for _ in range(count)]
+                    return self._send(200, {'places': places})
+                if method == 'autocomplete':
+                    text = (body.get('input') or '').lower()
+                    suggestions = []
+                    for index in range(stub.pool_size):
+                        place = _stub_place(index)
+                        name = place['displayName']['text']
+                        if name.lower().startswith(text):
+                            suggestions.append({'placePrediction': {
+                                'placeId': place['id'],
+                                'text': {'text': f"{name}, {place['formattedAddress']}"},
+                                'structuredFormat': {
+                                    'mainText': {'text': name},
+                                    'secondaryText': {'text': place['formattedAddress']},
+                                },
+                            }})
+                        if len(suggestions) == 5:
+                            break
+                    return self._send(200, {'suggestions': suggestions})
+                self._send(404, {'error': {'code': 404}})
+
+        return Handler
+
+
+def _count_calls(cls, name, label):
+    original = getattr(cls, name)
+
+    @functools.wraps(original)
+    def counted(*args, **kwargs):
+        firestore_ops.add(label)
+        return original(*args, **kwargs)
+
+    setattr(cls, name, counted)
+
+
+def _instrument_firestore():
+    from google.cloud.firestore_v1 import batch, client, document, query, transaction
+
+    _count_calls(document.DocumentReference, 'get', 'documentGet')
+    _count_calls(client.Client, 'get_all', 'batchGet')
+    _count_calls(query.Query, 'stream', 'query')
+    _count_calls(batch.WriteBatch, 'commit', 'batchCommit')
+    _count_calls(transaction.Transaction, '_begin', 'transactionBegin')
+    _count_calls(transaction.Transaction, '_commit', 'transactionCommit')
+
+
+def _configure_environment(stub, args):
+    """Must run before the function modules are imported; they read config at import time."""
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        sys.exit('FIRESTORE_EMULATOR_HOST is not set; start the Firestore emulator first.')
+
+    os.environ.setdefault('GCLOUD_PROJECT', _PROJECT_ID)
+    os.environ.setdefault('GOOGLE_CLOUD_PROJECT', os.environ['GCLOUD_PROJECT'])
+    os.environ['GOOGLE_PLACES_API_KEY'] = 'stub-key'
+    os.environ['PLACES_API_BASE_URL'] = stub.base_url
+    # Background refreshes would try to reach Cloud Tasks.
+    os.environ.setdefault('MAYPOLE_FRESH_SECONDS', str(10 * 365 * 24 * 60 * 60))
+    if not args.enforce_admission:
+        os.environ['PLACES_RATE_LIMIT_PER_SECOND'] = '1000000'
+        os.environ['PLACES_RATE_LIMIT_BURST'] = '1000000'
+        os.environ['PLACES_MAX_CONCURRENT_REQUESTS'] = '1000000'
+
+    import firebase_admin
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+
+    class _EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(_EmulatorCredential(), {'projectId': os.environ['GCLOUD_PROJECT']})
+
+
+def _reset_firestore():
+    import requests
+
+    host = os.environ['FIRESTORE_EMULATOR_HOST']
+    project = os.environ['GCLOUD_PROJECT']
+    requests.delete(f'http://{host}/emulator/v1/projects/{project}/databases/(default)/documents', timeout=30)
+
+
+class _RequestFactory:
+    def __init__(self, pool_size, stale_rate, clients, seed):
+        self._pool_size = pool_size
+        self._stale_rate = stale_rate
+        self._clients = clients
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Zipf-like popularity: a few places get most of the traffic, as in production.
+        self._weights = [1 / (index + 1) for index in range(pool_size)]
+
+    def _pick(self):
+        with self._lock:
+            index = self._rng.choices(range(self._pool_size), weights=self._weights)[0]
+            return index, self._rng.random(), self._rng.randrange(self._clients)
+
+    def build(self, function_name):
+        """Returns (method, headers, json body, client IP) for one call."""
+        index, roll, client = self._pick()
+        place = _stub_place(index)
+        name = place['displayName']['text']
+        location = place['location']
+        client_ip = f'10.0.{client // 256}.{client % 256}'
+
+        if function_name == 'resolve_maypole':
+            place_id = f'stale-{index}' if roll < self._stale_rate else place['id']
+            return 'POST', {}, {
+                'googlePlaceId': place_id,
+                'name': name,
+                'address': place['formattedAddress'],
+            }, client_ip
+        if function_name == 'places_autocomplete':
+            words = name.split()
+            text = f'{words[0]} {words[1][:max(1, int(roll * len(words[1])))]}'
+            return 'POST', {}, {
+                'input': text,
+                'locationBias': {'circle': {'center': location, 'radius': 5000}},
+            }, client_ip
+        if function_name == 'places_place_details':
+            return 'GET', {'X-Place-Id': place['id']}, None, client_ip
+        if function_name == 'places_reverse_geocode':
+            return 'POST', {}, {**location, 'radiusMeters': 150, 'maxResultCount': 5}, client_ip
+        raise ValueError(f'Unknown function {function_name}')
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _upstream_profile(args):
+    """The --profile preset with any per-field command-line overrides applied."""
+    profile = dict(zip(_PROFILE_FIELDS, _PROFILES[args.profile]))
+    for field in _PROFILE_FIELDS:
+        if getattr(args, field) is not None:
+            profile[field] = getattr(args, field)
+
+    if profile['median_ms'] < 0 or profile['p99_ms'] < profile['median_ms']:
+        sys.exit('--p99-ms must be at least --median-ms, and both non-negative')
+    rates = [profile[field] for field in ('error_rate', 'rate_limited_rate', 'hang_rate')]
+    if any(rate < 0 for rate in rates) or sum(rates) > 1:
+        sys.exit('--error-rate, --rate-limited-rate and --hang-rate must be non-negative and sum to at most 1')
+    return profile
+
+
+def run(args):
+    profile = _upstream_profile(args)
+    stub = StubPlacesServer(
+        args.place_pool,
+        tuple(profile[field] for field in _PROFILE_FIELDS),
+        seed=args.seed,
+    ).start()
+    _configure_environment(stub, args)
+    if args.reset_firestore:
+        _reset_firestore()
+
+    import flask
+
+    import places
+
+    _instrument_firestore()
+    app = flask.Flask(__name__)
+    handlers = {
+        name: getattr(places, name)
+        for name in ('resolve_maypole', 'places_autocomplete', 'places_place_details', 'places_reverse_geocode')
+    }
+    mix = []
+    for entry in args.mix.split(','):
+        name, _, weight = entry.partition('=')
+        if name not in handlers:
+            sys.exit(f'Unknown function in --mix: {name}')
+        mix.append((name, float(weight or 1)))
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    factory = _RequestFactory(args.place_pool, args.stale_rate, args.clients, args.seed)
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    results_lock = threading.Lock()
+    issued = iter(range(args.requests))
+    issued_lock = threading.Lock()
+    mix_rng = random.Random(args.seed + 1)
+
+    def worker():
+        while True:
+            with issued_lock:
+                if next(issued, None) is None:
+                    return
+                function_name = mix_rng.choices(names, weights=weights)[0]
+            method, headers, body, client_ip = factory.build(function_name)
+            started_at = time.perf_counter()
+            with app.test_request_context(
+                '/',
+                method=method,
+                headers=headers,
+                json=body,
+                environ_base={'REMOTE_ADDR': client_ip},
+            ):
+                try:
+                    status = handlers[function_name](flask.request).status_code
+                except Exception as e:
+                    print(f"{function_name} raised: {e}", flush=True)
+                    status = 'exception'
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            with results_lock:
+                latencies[function_name].append(elapsed_ms)
+                statuses[function_name][status] += 1
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+    stub.stop()
+
+    return _summarize(latencies, statuses, elapsed, profile)
+
+
+def _summarize(latencies, statuses, elapsed, profile):
+    total = sum(len(values) for values in latencies.values())
+    upstream = upstream_calls.snapshot()
+    firestore = firestore_ops.snapshot()
+    return {
+        'upstreamProfile': profile,
+        'requests': total,
+        'elapsedSeconds': round(elapsed, 2),
+        'throughputPerSecond': round(total / elapsed, 1) if elapsed else None,
+        'functions': {
+            name: {
+                'requests': len(values),
+                'p50Ms': round(_percentile(sorted(values), 50), 1),
+                'p95Ms': round(_percentile(sorted(values), 95), 1),
+                'p99Ms': round(_percentile(sorted(values), 99), 1),
+                'statuses': {str(status): count for status, count in sorted(statuses[name].items(), key=str)},
+            }
+            for name, values in sorted(latencies.items())
+        },
+        'upstreamCalls': upstream,
+        'upstreamCallsPerRequest': round(sum(upstream.values()) / total, 3) if total else None,
+        'firestoreOps': firestore,
+        'firestoreOpsPerRequest': round(sum(firestore.values()) / total, 3) if total else None,
+    }
+
+
+def _print_report(summary):
+    print()
+    profile = summary['upstreamProfile']
+    print(f"Stub Places: median {profile['median_ms']:g}ms, p99 {profile['p99_ms']:g}ms, "
+          f"5xx {profile['error_rate']:g}, 429 {profile['rate_limited_rate']:g}, hang {profile['hang_rate']:g}")
+    print(f"{summary['requests']} requests in {summary['elapsedSeconds']}s "
+          f"({summary['throughputPerSecond']} req/s)")
+    print(f"{'function':<26}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for name, stats in summary['functions'].items():
+        statuses = ' '.join(f'{status}:{count}' for status, count in stats['statuses'].items())
+        print(f"{name:<26}{stats['requests']:>7}{stats['p50Ms']:>9}{stats['p95Ms']:>9}{stats['p99Ms']:>9}  {statuses}")
+    print(f"\nUpstream Places calls: {summary['upstreamCalls']} "
+          f"({summary['upstreamCallsPerRequest']} per request)")
+    print(f"Firestore operations: {summary['firestoreOps']} "
+          f"({summary['firestoreOpsPerRequest']} per request)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mix', default=_DEFAULT_MIX, help='comma-separated function=weight pairs')
+    parser.add_argument('--profile', choices=sorted(_PROFILES), default='healthy', help='stub Places latency/error profile')
+    parser.add_argument('--median-ms', type=float, help='override the profile\'s median upstream latency')
+    parser.add_argument('--p99-ms', type=float, help='override the profile\'s p99 upstream latency')
+    parser.add_argument('--error-rate', type=float, help='override the profile\'s share of 503 responses')
+    parser.add_argument('--rate-limited-rate', type=float, help='override the profile\'s share of 429 responses')
+    parser.add_argument('--hang-rate', type=float,
+                        help=f'override the profile\'s share of calls that hang for {_HANG_SECONDS}s, then 504')
+    parser.add_argument('--place-pool', type=int, default=500, help='distinct places in the stub')
+    parser.add_argument('--stale-rate', type=float, default=0.1, help='share of resolves using a retired place ID')
+    parser.add_argument('--clients', type=int, default=200, help='distinct client IPs')
+    parser.add_argument('--enforce-admission', action='store_true',
+                        help='keep the production rate and concurrency limits instead of disabling them')
+    parser.add_argument('--reset-firestore', action='store_true', help='clear the emulator before the run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args()
+
+    summary = run(args)
+    _print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Bulk-migrates legacy maypoles (documents keyed by their Google Place ID) to the
+alias scheme that resolve_maypole otherwise applies lazily, one request at a time.
+
+For every legacy maypoles/{googlePlaceId} document this writes
+`googlePlaceIdAliases`, `placeSlug`, `locationSlug` and the matching
+placeIdAliases/{googlePlaceId} entry. Any other maypole whose current
+`googlePlaceId` has no alias document yet gets one too, so every maypole is
+reachable through placeIdAliases. `updatedAt` is left untouched so the
+stale-while-revalidate refresh still picks these maypoles up.
+
+Pages are read in document-ID order and committed as parallel write batches.
+The last fully committed document ID is saved to a checkpoint file, so an
+interrupted run continues where it stopped. Once a full run has completed,
+deploy with MAYPOLE_LEGACY_LOOKUP=false to drop the legacy read from resolves.
+
+Run from the functions/ directory with Application Default Credentials:
+
+    python -m tools.migrate_legacy_maypoles --dry-run
+    python -m tools.migrate_legacy_maypoles --workers 8
+"""
+import argparse
+
+from firebase_admin import firestore
+
+from places import _alias_payload, _legacy_maypole_metadata
+from tools.firestore_jobs import add_job_arguments, run_paged_job
+
+_SELECTED_FIELDS = [
+    'googlePlaceId',
+    'googlePlaceIdAliases',
+    'placeSlug',
+    'locationSlug',
+    'name',
+    'address',
+    'latitude',
+    'longitude',
+]
+
+
+def _needs_migration(doc_id, data, force=False):
+    if data.get('googlePlaceId', doc_id) != doc_id:
+        return False
+    if force:
+        return True
+    return not (
+        data.get('placeSlug')
+        and data.get('locationSlug')
+        and doc_id in (data.get('googlePlaceIdAliases') or [])
+    )
+
+
+def _current_alias_ref(db, doc_id, data):
+    google_place_id = data.get('googlePlaceId')
+    if google_place_id and google_place_id != doc_id:
+        return db.collection('placeIdAliases').document(google_place_id)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_job_arguments(parser, checkpoint='migrate_legacy_maypoles.checkpoint')
+    parser.add_argument('--force', action='store_true', help='rewrite legacy maypoles that look migrated')
+    args = parser.parse_args()
+
+    def prefetch(db, doc_id, data):
+        alias_ref = _current_alias_ref(db, doc_id, data)
+        return [alias_ref] if alias_ref else []
+
+    def plan_writes(db, doc_id, data, snapshots):
+        writes = []
+        if _needs_migration(doc_id, data, args.force):
+            writes += [
+                (db.collection('maypoles').document(doc_id), _legacy_maypole_metadata(doc_id, data)),
+                (db.collection('placeIdAliases').document(doc_id), _alias_payload(doc_id)),
+            ]
+
+        # Without an alias, resolve_maypole can only find this maypole by a
+        # googlePlaceId field query. Never repoint an alias that already exists.
+        alias_ref = _current_alias_ref(db, doc_id, data)
+        alias_doc = snapshots.get(alias_ref.path) if alias_ref else None
+        if alias_ref and not (alias_doc and alias_doc.exists):
+            writes += [
+                (db.collection('maypoles').document(doc_id),
+                 {'googlePlaceIdAliases': firestore.ArrayUnion([data['googlePlaceId']])}),
+                (alias_ref, _alias_payload(doc_id)),
+            ]
+        return writes
+
+    run_paged_job(
+        'maypoles',
+        plan_writes,
+        select=_SELECTED_FIELDS,
+        page_size=args.page_size,
+        workers=args.workers,
+        checkpoint=None if args.dry_run else args.checkpoint,
+        dry_run=args.dry_run,
+        prefetch=prefetch,
+    )
+
+
+if __name__ == '__main__':
+    main()